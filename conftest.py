@@ -0,0 +1,31 @@
+# Shared pytest fixtures for the FastAPI migration tests
+
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--runslow", action="store_true", default=False,
+        help="also run tests marked slow (performance and integration)"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: performance or end-to-end test, skipped unless --runslow")
+
+
+def pytest_collection_modifyitems(config, items):
+    # Keep the default run to the fast parity checks
+    if config.getoption("--runslow"):
+        return
+    skip_slow = pytest.mark.skip(reason="needs --runslow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+
+@pytest.fixture(scope="session")
+def fastapi_app():
+    """The FastAPI application, resolved once per session (once per xdist worker)"""
+    from fastapi_example import app
+    return app
@@ -1,23 +1,51 @@
 # FastAPI Migration Example - Modernized Implementation
 # This demonstrates the converted FastAPI structure with improvements
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, TypeAdapter, validator
+from typing import Optional, List, Tuple, Dict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import httpx
+import time
 import jwt
+import orjson
+from cachetools import TTLCache
 from passlib.context import CryptContext
-from supabase import create_client, Client
+from supabase import AsyncClient, AsyncClientOptions
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
 import os
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 import logging
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Give the app its own upstream pool and hashing workers; release both on shutdown"""
+    app.state.supabase = create_supabase_client()
+    app.state.password_executor = create_password_executor()
+    try:
+        yield
+    finally:
+        await app.state.supabase.options.httpx_client.aclose()
+        app.state.password_executor.shutdown()
+        # Anything served after shutdown falls back to the import-time defaults
+        del app.state.supabase
+        del app.state.password_executor
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Mandarin Blueprint API",
     description="Modernized FastAPI backend for Mandarin learning platform",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 logger = logging.getLogger(__name__)
 # Supabase configuration
@@ -25,25 +53,88 @@ logger = logging.getLogger(__name__)
 # supabase_key = os.getenv("SUPABASE_KEY", "YOUR_SUPABASE_KEY")
 supabase_url = "https://mjcoxnkdtxhbzaoxjpen.supabase.co"
 supabase_key = "sb_publishable_p6dm-Be1gx81qgvHiFovQg__I_xcSOn"
-supabase: Client = create_client(supabase_url, supabase_key)
+
+
+def create_supabase_client() -> AsyncClient:
+    """Async Supabase client on its own keep-alive HTTP/2 connection pool"""
+    # One pool shared by every Supabase call, so queries reuse connections
+    # instead of paying a TCP+TLS handshake each
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200, keepalive_expiry=60)
+    )
+    return AsyncClient(supabase_url, supabase_key, options=AsyncClientOptions(httpx_client=http_client))
+
+
+# Async client: queries are awaited so the event loop keeps serving other
+# requests while PostgREST responds. Lifespan startup replaces it with a
+# per-app client on app.state; this default serves apps run without lifespan.
+supabase: AsyncClient = create_supabase_client()
 
 # Security configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Shared JWT codec and pre-derived HMAC key, so token calls skip per-call setup
+_JWT = jwt.PyJWT()
+_HMAC_KEY = jwt.algorithms.HMACAlgorithm(jwt.algorithms.HMACAlgorithm.SHA256).prepare_key(SECRET_KEY)
+
+# New hashes use argon2id; existing bcrypt hashes still verify
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__time_cost=2,
+    argon2__memory_cost=19456,
+    argon2__parallelism=1
+)
+
+
+def create_password_executor() -> ThreadPoolExecutor:
+    """Dedicated workers for hashing/verifying passwords"""
+    # The hash libraries release the GIL, so these run in parallel without
+    # starving the event loop or its default executor
+    return ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="password")
+
+
+# Default pool for apps run without lifespan; startup puts a per-app one on app.state
+_password_executor = create_password_executor()
 security = HTTPBearer()
 
+# Verified-token cache: blake2b(token) -> (user row, token exp).
+# Keyed on a digest so the cache does not retain raw bearer tokens.
+TOKEN_CACHE_TTL_SECONDS = 5
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL_SECONDS)
+
+# Serialised published-course list: (monotonic expiry, JSON bytes)
+COURSES_CACHE_TTL_SECONDS = 30
+_courses_cache: Optional[Tuple[float, bytes]] = None
+_courses_cache_lock = asyncio.Lock()
+
+# SQLSTATEs raised by the functions in supabase/migrations
+RPC_ERROR_STATUS = {
+    "P0001": status.HTTP_400_BAD_REQUEST,
+    "P0002": status.HTTP_404_NOT_FOUND,
+}
+
 
 # ============= Pydantic Models (Request/Response) =============
 
+def precheck_email(v):
+    """Reject obviously malformed emails before the full EmailStr validation runs"""
+    if isinstance(v, str) and ('@' not in v or len(v) > 254):
+        raise ValueError('value is not a valid email address')
+    return v
+
+
 class UserRegister(BaseModel):
     email: EmailStr
     password: str
     username: str
     invitation_code: str
     
+    _precheck_email = validator('email', pre=True)(precheck_email)
+    
     @validator('password')
     def validate_password(cls, v):
         if len(v) < 8:
@@ -60,6 +151,8 @@ class UserRegister(BaseModel):
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
+    
+    _precheck_email = validator('email', pre=True)(precheck_email)
 
 
 class UserResponse(BaseModel):
@@ -125,6 +218,34 @@ class ReviewSubmit(BaseModel):
         return v
 
 
+# Validates and serialises a whole course list in one pydantic-core call
+_COURSE_LIST_ADAPTER = TypeAdapter(List[CourseResponse])
+
+
+# Every id in a batch goes into one id=in.(...) query string, so batches stay well under URL limits
+MAX_REVIEW_BATCH_SIZE = 500
+
+
+class BatchReviewSubmit(BaseModel):
+    items: List[ReviewSubmit]
+    
+    @validator('items')
+    def validate_items(cls, v):
+        if not v:
+            raise ValueError('At least one review is required')
+        if len(v) > MAX_REVIEW_BATCH_SIZE:
+            raise ValueError(f'At most {MAX_REVIEW_BATCH_SIZE} reviews are allowed per batch')
+        if len({item.review_id for item in v}) != len(v):
+            raise ValueError('Each review may appear only once per batch')
+        return v
+
+
+# SM-2 easiness adjustment for each quality grade (0..5, enforced by ReviewSubmit)
+_SM2_EASINESS_DELTA = tuple(0.1 - (5 - q) * (0.08 + (5 - q) * 0.02) for q in range(6))
+# Fixed intervals (days) for the first and second successful repetitions
+_SM2_INITIAL_INTERVALS = (1, 6)
+
+
 # ============= Authentication & Security =============
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -146,17 +267,89 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = _JWT.encode(to_encode, _HMAC_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def get_supabase(request: Request) -> AsyncClient:
+    """Dependency: the app's Supabase client, or the import-time default without lifespan"""
+    return getattr(request.app.state, 'supabase', supabase)
+
+
+def get_password_executor(request: Request) -> ThreadPoolExecutor:
+    """Dependency: the app's hashing pool, or the import-time default without lifespan"""
+    return getattr(request.app.state, 'password_executor', _password_executor)
+
+
+class UserLoader:
+    """Coalesce user lookups issued in the same event-loop tick into one query"""
+    
+    def __init__(self):
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._flushes: set = set()
+        self._client: Optional[AsyncClient] = None
+    
+    async def load(self, user_id, client: AsyncClient) -> Optional[dict]:
+        key = str(user_id)
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                # First lookup this tick schedules the flush for everyone, on its client
+                self._client = client
+                loop.call_soon(self._start_flush)
+            future = self._pending[key] = loop.create_future()
+        # Shielded so one cancelled request does not cancel the shared result
+        return await asyncio.shield(future)
+    
+    def _start_flush(self):
+        task = asyncio.get_running_loop().create_task(self._flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+    
+    async def _flush(self):
+        batch, self._pending = self._pending, {}
+        try:
+            users = await self._client.table('users').select('id, email, username, created_at').in_(
+                'id', list(batch)
+            ).execute()
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        rows = {str(row['id']): row for row in users.data}
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(rows.get(key))
+
+
+_user_loader = UserLoader()
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncClient = Depends(get_supabase)
+):
     """Dependency to get current authenticated user"""
     token = credentials.credentials
     
+    # Repeat tokens skip both signature verification and the user lookup
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _token_cache.get(cache_key)
+    if cached is not None:
+        cached_user, token_exp = cached
+        if token_exp > time.time():
+            return cached_user
+    
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
+        payload = _JWT.decode(
+            token, _HMAC_KEY, algorithms=[ALGORITHM],
+            options={"verify_signature": True, "require": ["exp", "sub"]}
+        )
+        # RFC 7519 subjects are strings (PyJWT >= 2.10 rejects others); the loader keys on them as-is
+        user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -168,85 +361,88 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail="Invalid authentication credentials"
         )
     
-    # Get user from database
-    user = supabase.table('users').select('id, email, username, created_at').eq('id', user_id).execute()
+    # Get user from database, batched with concurrent lookups
+    user = await _user_loader.load(user_id, db)
     
-    if not user.data:
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
     
-    return user.data[0]
+    _token_cache[cache_key] = (user, payload["exp"])
+    return user
+
+
+def raise_for_rpc_error(exc: APIError) -> None:
+    """Re-raise a business-rule error from one of our Postgres functions as an HTTP error"""
+    if exc.code in RPC_ERROR_STATUS:
+        raise HTTPException(status_code=RPC_ERROR_STATUS[exc.code], detail=exc.message)
 
 
 # ============= Authentication Routes =============
 
 @app.post("/api/auth/register", response_model=Token, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserRegister):
+async def register(
+    user_data: UserRegister,
+    db: AsyncClient = Depends(get_supabase),
+    password_executor: ThreadPoolExecutor = Depends(get_password_executor)
+):
     """User registration endpoint with improved validation"""
     
-    # Verify invitation code
-    invitation = supabase.table('invitation_codes').select('*').eq(
+    # Cheap read before the expensive hash, so requests without a usable code
+    # cannot tie up the hashing pool that logins share. register_user still
+    # claims the code atomically; this only screens out hopeless requests.
+    invitation = await db.table('invitation_codes').select('code').eq(
         'code', user_data.invitation_code
-    ).eq('used', False).execute()
-    
+    ).eq('used', False).limit(1).execute()
     if not invitation.data:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or used invitation code"
         )
     
-    # Check if user already exists
-    existing_user = supabase.table('users').select('id').eq('email', user_data.email).execute()
-    if existing_user.data:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    # Hash password off the event loop
+    hashed_password = await asyncio.get_running_loop().run_in_executor(
+        password_executor, get_password_hash, user_data.password
+    )
     
-    # Create user
+    # Claim the invitation and create the user in one transactional round-trip
     try:
-        user = supabase.table('users').insert({
-            'email': user_data.email,
-            'username': user_data.username,
-            'password_hash': hashed_password,
-            'created_at': datetime.utcnow().isoformat()
+        user = await db.rpc('register_user', {
+            'p_email': user_data.email,
+            'p_username': user_data.username,
+            'p_password_hash': hashed_password,
+            'p_invitation_code': user_data.invitation_code
         }).execute()
-        
-        user_record = user.data[0]
-        
-        # Mark invitation code as used
-        supabase.table('invitation_codes').update({
-            'used': True,
-            'used_by': user_record['id'],
-            'used_at': datetime.utcnow().isoformat()
-        }).eq('code', user_data.invitation_code).execute()
-        
-        # Create access token
-        access_token = create_access_token(data={"sub": user_record['id']})
-        
-        return Token(
-            access_token=access_token,
-            user=UserResponse(**user_record)
-        )
-        
-    except Exception as e:
+    except APIError as e:
+        raise_for_rpc_error(e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Registration failed: {str(e)}"
+            detail=f"Registration failed: {e.message}"
         )
+    
+    user_record = user.data[0]
+    
+    # Create access token
+    access_token = create_access_token(data={"sub": str(user_record['id'])})
+    
+    return Token(
+        access_token=access_token,
+        user=UserResponse(**user_record)
+    )
 
 
 @app.post("/api/auth/login", response_model=Token)
-async def login(credentials: UserLogin):
+async def login(
+    credentials: UserLogin,
+    db: AsyncClient = Depends(get_supabase),
+    password_executor: ThreadPoolExecutor = Depends(get_password_executor)
+):
     """User login endpoint with JWT token generation"""
     
     # Get user from database
-    user = supabase.table('users').select('*').eq('email', credentials.email).execute()
+    user = await db.table('users').select('*').eq('email', credentials.email).execute()
     
     if not user.data:
         raise HTTPException(
@@ -256,15 +452,17 @@ async def login(credentials: UserLogin):
     
     user_data = user.data[0]
     
-    # Verify password
-    if not verify_password(credentials.password, user_data['password_hash']):
+    # Verify password off the event loop; hashing holds a worker for its full cost
+    if not await asyncio.get_running_loop().run_in_executor(
+        password_executor, verify_password, credentials.password, user_data['password_hash']
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
     
     # Create access token
-    access_token = create_access_token(data={"sub": user_data['id']})
+    access_token = create_access_token(data={"sub": str(user_data['id'])})
     
     return Token(
         access_token=access_token,
@@ -286,18 +484,35 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
 # ============= Course Management Routes =============
 
 @app.get("/api/courses", response_model=List[CourseResponse])
-async def get_courses():
+async def get_courses(db: AsyncClient = Depends(get_supabase)):
     """Get all published courses"""
-    courses = supabase.table('courses').select('*').eq('published', True).execute()
-    return [CourseResponse(**course) for course in courses.data]
+    global _courses_cache
+    
+    # Requests within the TTL window share one query and one serialisation
+    if _courses_cache is None or _courses_cache[0] <= time.monotonic():
+        async with _courses_cache_lock:
+            if _courses_cache is None or _courses_cache[0] <= time.monotonic():
+                courses = await db.table('courses').select('*').eq('published', True).execute()
+                _courses_cache = (
+                    time.monotonic() + COURSES_CACHE_TTL_SECONDS,
+                    _COURSE_LIST_ADAPTER.dump_json(_COURSE_LIST_ADAPTER.validate_python(courses.data))
+                )
+    
+    # Return the bytes directly so FastAPI skips a second validate/serialise pass
+    return Response(content=_courses_cache[1], media_type="application/json")
 
 
 @app.get("/api/courses/{course_id}", response_model=dict)
-async def get_course(course_id: int):
+async def get_course(course_id: int, db: AsyncClient = Depends(get_supabase)):
     """Get specific course with content"""
     
-    # Get course
-    course = supabase.table('courses').select('*').eq('id', course_id).execute()
+    # Course and content lookups are independent, so overlap the round-trips
+    course, content = await asyncio.gather(
+        db.table('courses').select('*').eq('id', course_id).execute(),
+        db.table('course_content').select('*').eq(
+            'course_id', course_id
+        ).order('sequence').execute()
+    )
     
     if not course.data:
         raise HTTPException(
@@ -305,140 +520,222 @@ async def get_course(course_id: int):
             detail="Course not found"
         )
     
-    # Get course content
-    content = supabase.table('course_content').select('*').eq(
-        'course_id', course_id
-    ).order('sequence').execute()
-    
-    course_data = course.data[0]
-    course_data['content'] = content.data
-    
-    return course_data
+    # Build a new dict rather than mutating the row the client handed back
+    return {**course.data[0], 'content': content.data}
 
 
 @app.post("/api/courses/{course_id}/enroll", response_model=EnrollmentResponse, status_code=status.HTTP_201_CREATED)
-async def enroll_course(course_id: int, current_user: dict = Depends(get_current_user)):
+async def enroll_course(
+    course_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncClient = Depends(get_supabase)
+):
     """Enroll authenticated user in a course"""
     
-    # Check if course exists
-    course = supabase.table('courses').select('id').eq('id', course_id).execute()
-    if not course.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Course not found"
-        )
-    
-    # Check if already enrolled
-    enrollment = supabase.table('enrollments').select('*').eq(
-        'user_id', current_user['id']
-    ).eq('course_id', course_id).execute()
-    
-    if enrollment.data:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Already enrolled in this course"
-        )
-    
-    # Create enrollment
-    new_enrollment = supabase.table('enrollments').insert({
-        'user_id': current_user['id'],
-        'course_id': course_id,
-        'enrolled_at': datetime.utcnow().isoformat(),
-        'progress': 0
-    }).execute()
+    # Course check, duplicate check and insert run as one database call
+    try:
+        new_enrollment = await db.rpc('enroll_in_course', {
+            'p_user_id': current_user['id'],
+            'p_course_id': course_id
+        }).execute()
+    except APIError as e:
+        raise_for_rpc_error(e)
+        raise
     
     return EnrollmentResponse(**new_enrollment.data[0])
 
 
 # ============= Review System Routes (Spaced Repetition) =============
 
+# Rows fetched per PostgREST request when streaming due reviews
+DUE_REVIEWS_PAGE_SIZE = 500
+
+# Only the columns the review UI renders; served by reviews_due_idx
+_DUE_REVIEW_COLUMNS = (
+    'id, character_id, repetition, easiness, interval, next_review, last_review, '
+    'characters(id, hanzi, pinyin, meaning)'
+)
+
+
 @app.get("/api/reviews/due", response_model=dict)
-async def get_due_reviews(current_user: dict = Depends(get_current_user)):
+async def get_due_reviews(
+    current_user: dict = Depends(get_current_user),
+    db: AsyncClient = Depends(get_supabase)
+):
     """Get reviews due for current user using spaced repetition algorithm"""
     
     current_time = datetime.utcnow().isoformat()
     
-    # Get due reviews
-    reviews = supabase.table('reviews').select('*, characters(*)').eq(
-        'user_id', current_user['id']
-    ).lte('next_review', current_time).execute()
-    
-    return {
-        "reviews": reviews.data,
-        "count": len(reviews.data)
-    }
-
-
-@app.post("/api/reviews/submit", response_model=dict)
-async def submit_review(review_data: ReviewSubmit, current_user: dict = Depends(get_current_user)):
-    """Submit review and update spaced repetition schedule using SM-2 algorithm"""
-    
-    # Get current review
-    review = supabase.table('reviews').select('*').eq(
-        'id', review_data.review_id
-    ).eq('user_id', current_user['id']).execute()
+    def due_reviews_page(after: Optional[dict] = None):
+        query = db.table('reviews').select(_DUE_REVIEW_COLUMNS).eq(
+            'user_id', current_user['id']
+        ).lte('next_review', current_time)
+        if after is not None:
+            # Keyset on (next_review, id): resume strictly after the last row emitted,
+            # so reviews submitted mid-stream cannot shift later pages past unseen rows
+            last_due = f'"{after["next_review"]}"'
+            query = query.or_(
+                f'next_review.gt.{last_due},and(next_review.eq.{last_due},id.gt.{after["id"]})'
+            )
+        return query.order('next_review').order('id').limit(DUE_REVIEWS_PAGE_SIZE).execute()
     
-    if not review.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Review not found"
-        )
+    # Fetch the first page before streaming so query errors still get a proper status
+    first_page = await due_reviews_page()
     
-    review_record = review.data[0]
+    async def stream_due_reviews():
+        # Emit each page as it arrives; the full review list is never held in memory
+        rows = first_page.data
+        count = 0
+        yield b'{"reviews":['
+        while rows:
+            yield (b',' if count else b'') + b','.join(orjson.dumps(row) for row in rows)
+            count += len(rows)
+            if len(rows) < DUE_REVIEWS_PAGE_SIZE:
+                break
+            rows = (await due_reviews_page(rows[-1])).data
+        yield b'],"count":' + str(count).encode() + b'}'
     
-    # SM-2 Algorithm Implementation
+    return StreamingResponse(stream_due_reviews(), media_type="application/json")
+
+
+def sm2_schedule(review_record: dict, quality: int) -> Tuple[int, float, float]:
+    """Apply one SM-2 step; returns (repetition, easiness, interval in days)"""
     repetition = review_record.get('repetition', 0) + 1
     easiness = review_record.get('easiness', 2.5)
     interval = review_record.get('interval', 1)
-    quality = review_data.quality
     
     # Update easiness factor
-    new_easiness = easiness + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
-    new_easiness = max(1.3, new_easiness)
+    new_easiness = max(1.3, easiness + _SM2_EASINESS_DELTA[quality])
     
     # Calculate new interval
     if quality < 3:
         new_interval = 1
         new_repetition = 0
     else:
-        if repetition == 1:
-            new_interval = 1
-        elif repetition == 2:
-            new_interval = 6
+        if repetition <= len(_SM2_INITIAL_INTERVALS):
+            new_interval = _SM2_INITIAL_INTERVALS[repetition - 1]
         else:
             new_interval = interval * new_easiness
         new_repetition = repetition
     
-    # Calculate next review date
-    next_review = datetime.utcnow() + timedelta(days=new_interval)
+    return new_repetition, new_easiness, new_interval
+
+
+@app.post("/api/reviews/submit", response_model=dict)
+async def submit_review(
+    review_data: ReviewSubmit,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncClient = Depends(get_supabase)
+):
+    """Submit review and update spaced repetition schedule using SM-2 algorithm"""
+    
+    # Get current review
+    review = await db.table('reviews').select('*').eq(
+        'id', review_data.review_id
+    ).eq('user_id', current_user['id']).execute()
+    
+    if not review.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Review not found"
+        )
+    
+    # SM-2 Algorithm Implementation
+    new_repetition, new_easiness, new_interval = sm2_schedule(review.data[0], review_data.quality)
+    
+    # Calculate next review date; one clock read serves both timestamps
+    now = datetime.utcnow()
+    next_review = now + timedelta(days=new_interval)
     
-    # Update review
-    updated_review = supabase.table('reviews').update({
+    # Update review; scoped to the caller's row and nothing is read back
+    await db.table('reviews').update({
         'repetition': new_repetition,
         'easiness': new_easiness,
         'interval': new_interval,
         'next_review': next_review.isoformat(),
-        'last_review': datetime.utcnow().isoformat()
-    }).eq('id', review_data.review_id).execute()
+        'last_review': now.isoformat()
+    }, returning=ReturnMethod.minimal).eq(
+        'id', review_data.review_id
+    ).eq('user_id', current_user['id']).execute()
     
     return {
         "message": "Review submitted successfully",
-        "next_review": next_review.isoformat(),
+        "next_review": next_review,
         "interval_days": new_interval,
         "easiness_factor": new_easiness
     }
 
 
+@app.post("/api/reviews/submit/batch", response_model=dict)
+async def submit_reviews_batch(
+    batch: BatchReviewSubmit,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncClient = Depends(get_supabase)
+):
+    """Submit a study session's reviews: one read and one write regardless of batch size"""
+    
+    review_ids = [item.review_id for item in batch.items]
+    
+    # Get all current reviews in one query
+    reviews = await db.table('reviews').select('*').in_(
+        'id', review_ids
+    ).eq('user_id', current_user['id']).execute()
+    
+    records = {row['id']: row for row in reviews.data}
+    missing = [review_id for review_id in review_ids if review_id not in records]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Reviews not found: {missing}"
+        )
+    
+    now = datetime.utcnow()
+    updates = []
+    results = []
+    for item in batch.items:
+        new_repetition, new_easiness, new_interval = sm2_schedule(records[item.review_id], item.quality)
+        next_review = now + timedelta(days=new_interval)
+        updates.append({
+            'id': item.review_id,
+            'repetition': new_repetition,
+            'easiness': new_easiness,
+            'interval': new_interval,
+            'next_review': next_review.isoformat(),
+            'last_review': now.isoformat()
+        })
+        results.append({
+            "review_id": item.review_id,
+            "next_review": next_review,
+            "interval_days": new_interval,
+            "easiness_factor": new_easiness
+        })
+    
+    # Apply every update in one set-based statement
+    await db.rpc('apply_review_updates', {
+        'p_user_id': current_user['id'],
+        'p_updates': updates
+    }).execute()
+    
+    return {
+        "message": "Reviews submitted successfully",
+        "results": results
+    }
+
+
 # ============= Health Check =============
 
+# Static parts of the health payload; only the timestamp changes per probe
+_HEALTH_BODY_PREFIX = f'{{"status":"healthy","version":"{app.version}","timestamp":"'.encode()
+_HEALTH_BODY_SUFFIX = b'"}'
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "version": "2.0.0"
-    }
+    return Response(
+        content=_HEALTH_BODY_PREFIX + datetime.utcnow().isoformat().encode() + _HEALTH_BODY_SUFFIX,
+        media_type="application/json"
+    )
 
 
 @app.exception_handler(Exception)
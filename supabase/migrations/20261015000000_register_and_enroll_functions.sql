@@ -0,0 +1,72 @@
+-- Transactional RPC functions for the FastAPI backend
+-- Each call is a single PostgREST round-trip executed in one transaction.
+-- Business-rule failures use SQLSTATE P0001 (-> HTTP 400) and P0002 (-> HTTP 404).
+
+-- Required for ON CONFLICT in enroll_in_course
+create unique index if not exists enrollments_user_course_key
+    on public.enrollments (user_id, course_id);
+
+
+-- Claim an invitation code and create the user it was issued for
+create or replace function public.register_user(
+    p_email text,
+    p_username text,
+    p_password_hash text,
+    p_invitation_code text
+)
+returns table (id bigint, email text, username text, created_at timestamptz)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    v_user public.users%rowtype;
+begin
+    -- Lock the code so concurrent registrations cannot both claim it
+    perform 1 from public.invitation_codes
+        where code = p_invitation_code and used = false
+        for update;
+    if not found then
+        raise exception 'Invalid or used invitation code' using errcode = 'P0001';
+    end if;
+
+    if exists (select 1 from public.users where email = p_email) then
+        raise exception 'Email already registered' using errcode = 'P0001';
+    end if;
+
+    insert into public.users (email, username, password_hash, created_at)
+        values (p_email, p_username, p_password_hash, now())
+        returning * into v_user;
+
+    update public.invitation_codes
+        set used = true, used_by = v_user.id, used_at = now()
+        where code = p_invitation_code;
+
+    return query select v_user.id, v_user.email, v_user.username, v_user.created_at;
+end;
+$$;
+
+
+-- Enroll a user in an existing course exactly once
+create or replace function public.enroll_in_course(
+    p_user_id bigint,
+    p_course_id bigint
+)
+returns setof public.enrollments
+language plpgsql
+as $$
+begin
+    if not exists (select 1 from public.courses where id = p_course_id) then
+        raise exception 'Course not found' using errcode = 'P0002';
+    end if;
+
+    return query
+        insert into public.enrollments (user_id, course_id, enrolled_at, progress)
+        values (p_user_id, p_course_id, now(), 0)
+        on conflict (user_id, course_id) do nothing
+        returning *;
+
+    if not found then
+        raise exception 'Already enrolled in this course' using errcode = 'P0001';
+    end if;
+end;
+$$;
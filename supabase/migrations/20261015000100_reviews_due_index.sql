@@ -0,0 +1,8 @@
+-- Due-review lookups filter on (user_id, next_review <= now) and page by keyset
+-- on (next_review, id); with id as the trailing key and the scheduling columns
+-- covered, each page is a single index range scan.
+-- On a large live table, run this statement by hand with CONCURRENTLY instead;
+-- migrations execute inside a transaction, which CONCURRENTLY does not allow.
+create index if not exists reviews_due_idx
+    on public.reviews (user_id, next_review, id)
+    include (repetition, easiness, interval);
@@ -0,0 +1,8 @@
+-- The API only issues short, parameterised lookups; JIT compilation costs more
+-- than it saves on them. PostgREST applies these settings per request after
+-- switching to the caller's role.
+alter role anon set jit = off;
+alter role authenticated set jit = off;
+
+-- Make PostgREST pick up the new role settings without a restart
+notify pgrst, 'reload config';
@@ -0,0 +1,28 @@
+-- Apply a batch of SM-2 schedule updates computed by the API in one statement.
+-- p_updates is a JSON array of
+--   {id, repetition, easiness, interval, next_review, last_review}
+-- Rows not owned by p_user_id are left untouched.
+create or replace function public.apply_review_updates(
+    p_user_id bigint,
+    p_updates jsonb
+)
+returns void
+language sql
+as $$
+    update public.reviews as r
+    set repetition = u.repetition,
+        easiness = u.easiness,
+        "interval" = u."interval",
+        next_review = u.next_review,
+        last_review = u.last_review
+    from jsonb_to_recordset(p_updates) as u(
+        id bigint,
+        repetition integer,
+        easiness double precision,
+        "interval" double precision,
+        next_review timestamptz,
+        last_review timestamptz
+    )
+    where r.id = u.id
+      and r.user_id = p_user_id;
+$$;
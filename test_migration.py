@@ -1,90 +1,331 @@
 # Testing Suite for FastAPI Migration
 # Comprehensive tests ensuring feature parity and preventing regressions
 
+import asyncio
+import functools
+import httpx
+import operator
 import pytest
-from fastapi.testclient import TestClient
+import pytest_asyncio
+from asgi_lifespan import LifespanManager
 from datetime import datetime, timedelta
+from types import MappingProxyType
 import jwt
-from fastapi_example import app, SECRET_KEY, ALGORITHM
+import orjson
+from postgrest.exceptions import APIError
+from fastapi_example import SECRET_KEY, ALGORITHM, get_supabase
+
+# ============= Mock Data =============
+
+# Frozen once at import; the mocks hand out these same read-only objects on every call
+_NOW_ISO = datetime.utcnow().isoformat()
+
+
+class MockSupabaseResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+_USERS_ROW = MappingProxyType({
+    'id': 1,
+    'email': 'test@example.com',
+    'username': 'testuser',
+    # bcrypt of 'password123' at the minimum cost so verification stays cheap
+    'password_hash': '$2b$04$nNYgZ8fUTzerpnopUG5c0uI.5w9RM2hiDDqgQGliA8EWrUVmZDj5q',
+    'created_at': _NOW_ISO
+})
+_INVITATION_ROW = MappingProxyType({
+    'code': 'TESTCODE123',
+    'used': False
+})
+_COURSES_ROW = MappingProxyType({
+    'id': 1,
+    'title': 'HSK 1',
+    'description': 'Beginner Chinese',
+    'published': True,
+    'created_at': _NOW_ISO
+})
+# Plain dicts: the due-review stream hands rows straight to orjson, which rejects mapping proxies
+_REVIEWS_ROWS = [
+    {
+        'id': review_id,
+        'user_id': 1,
+        'character_id': review_id,
+        'repetition': 2,
+        'easiness': 2.5,
+        'interval': 6,
+        'next_review': _NOW_ISO,
+        'last_review': _NOW_ISO
+    }
+    for review_id in (1, 2, 3)
+]
+
+_USERS_RESPONSE = MockSupabaseResponse([_USERS_ROW])
+_INVITATION_RESPONSE = MockSupabaseResponse([_INVITATION_ROW])
+_COURSES_RESPONSE = MockSupabaseResponse([_COURSES_ROW])
+_REVIEWS_RESPONSE = MockSupabaseResponse(_REVIEWS_ROWS)
+_EMPTY_RESPONSE = MockSupabaseResponse([])
+
+# Canned response per table; anything else reads as empty
+_TABLE_RESPONSES = {
+    'users': _USERS_RESPONSE,
+    'invitation_codes': _INVITATION_RESPONSE,
+    'courses': _COURSES_RESPONSE,
+    'reviews': _REVIEWS_RESPONSE,
+}
+
+
+# Comparison operators the mock understands in PostgREST filter strings
+_FILTER_OPS = {
+    'eq': operator.eq,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+
+def _split_filters(filters):
+    """Split a PostgREST logic-tree string on its top-level commas"""
+    terms, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(filters):
+        if ch == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            terms.append(filters[start:i])
+            start = i + 1
+    terms.append(filters[start:])
+    return terms
+
+
+def _row_matches(row, term):
+    """Evaluate one PostgREST filter term (col.op.value, and(...), or(...)) on a mock row"""
+    for logic, combine in (('and(', all), ('or(', any)):
+        if term.startswith(logic):
+            return combine(_row_matches(row, t) for t in _split_filters(term[len(logic):-1]))
+    field, op, value = term.split('.', 2)
+    value = value.strip('"')
+    current = row.get(field)
+    if isinstance(current, int):
+        value = int(value)
+    return _FILTER_OPS[op](current, value)
+
+
+# ============= Token Signing =============
+
+# Signer and HMAC key prepared once, as in the app, but independently of it
+_JWT = jwt.PyJWT()
+_HMAC_KEY = jwt.algorithms.HMACAlgorithm(jwt.algorithms.HMACAlgorithm.SHA256).prepare_key(SECRET_KEY)
+
+
+# ============= Request Bodies =============
+
+# Repeated payloads are encoded once with orjson and sent as raw content
+JSON_HEADERS = MappingProxyType({"content-type": "application/json"})
+
+REGISTER_BODY = orjson.dumps({
+    "email": "newuser@example.com",
+    "password": "SecurePass123!",
+    "username": "newuser",
+    "invitation_code": "TESTCODE123"
+})
+REGISTER_INVALID_INVITATION_BODY = orjson.dumps({
+    "email": "newuser@example.com",
+    "password": "SecurePass123!",
+    "username": "newuser",
+    "invitation_code": "INVALID"
+})
+REGISTER_EXISTING_EMAIL_BODY = orjson.dumps({
+    "email": "test@example.com",
+    "password": "SecurePass123!",
+    "username": "newuser",
+    "invitation_code": "TESTCODE123"
+})
+INTEGRATION_REGISTER_BODY = orjson.dumps({
+    "email": "integration@test.com",
+    "password": "SecurePass123!",
+    "username": "integrationuser",
+    "invitation_code": "TESTCODE123"
+})
+LOGIN_BODY = orjson.dumps({"email": "test@example.com", "password": "password123"})
+LOGIN_WRONG_PASSWORD_BODY = orjson.dumps({"email": "test@example.com", "password": "wrongpassword"})
+REVIEW_BODIES = {quality: orjson.dumps({"review_id": 1, "quality": quality}) for quality in (0, 5)}
 
-client = TestClient(app)
 
 # ============= Test Fixtures =============
 
-@pytest.fixture
-def mock_supabase(monkeypatch):
-    """Mock Supabase client for testing"""
-    class MockSupabaseResponse:
-        def __init__(self, data):
-            self.data = data
-    
-    class MockSupabaseTable:
-        def __init__(self, table_name):
-            self.table_name = table_name
-            self._data = {}
+# Async tests must run on the session loop that owns the session client
+session_loop = pytest.mark.asyncio(scope="session")
+
+
+@pytest_asyncio.fixture(scope="session")
+async def aclient(fastapi_app):
+    """Single in-process async client for the suite; app startup/shutdown runs once"""
+    async with LifespanManager(fastapi_app) as manager:
+        transport = httpx.ASGITransport(app=manager.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            yield c
+
+
+@pytest.fixture(scope="session")
+def bench_get(fastapi_app):
+    """Sync GET for pytest-benchmark, which only times sync callables"""
+    # Private loop with a client of its own; the session-loop client is never driven
+    # from another loop, and app startup/shutdown stays with it
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fastapi_app), base_url="http://test")
+    yield lambda url: loop.run_until_complete(client.get(url))
+    loop.run_until_complete(client.aclose())
+    loop.close()
+
+
+@pytest.fixture(scope="class")
+def mock_supabase(fastapi_app):
+    """Mock Supabase client for testing, patched in once per test class"""
+    class MockSupabaseQuery:
+        """One query against a table; filters and paging narrow its canned rows"""
+        def __init__(self, table, response):
+            self.table = table
+            self._response = response
+        
+        def _chain(self, *args, **kwargs):
+            return self
         
-        def select(self, *args, **kwargs):
+        # Canned rows are stored in (next_review, id) order, so order() is a no-op;
+        # lte and in_ never separate the mocked cases
+        lte = in_ = order = _chain
+        
+        def _narrow(self, rows):
+            if len(rows) != len(self._response.data):
+                self._response = MockSupabaseResponse(rows) if rows else _EMPTY_RESPONSE
             return self
         
         def eq(self, field, value):
-            return self
+            return self._narrow([row for row in self._response.data if row.get(field, value) == value])
         
-        def lte(self, field, value):
-            return self
+        def or_(self, filters):
+            return self._narrow([row for row in self._response.data if _row_matches(row, f'or({filters})')])
         
-        def order(self, field):
-            return self
+        def range(self, start, end):
+            return self._narrow(self._response.data[start:end + 1])
+        
+        def limit(self, size):
+            return self._narrow(self._response.data[:size])
         
-        def execute(self):
-            # Return mock data based on table
-            if self.table_name == 'users':
+        async def execute(self):
+            self.table.calls += 1
+            self.table.owner.round_trips += 1
+            return self._response
+    
+    class MockSupabaseTable:
+        """One instance per table name; counts the queries executed against it"""
+        def __init__(self, table_name, owner):
+            self.table_name = table_name
+            self.owner = owner
+            self.response = _TABLE_RESPONSES.get(table_name, _EMPTY_RESPONSE)
+            self.calls = 0
+        
+        def select(self, *args, **kwargs):
+            return MockSupabaseQuery(self, self.response)
+        
+        def insert(self, data, **kwargs):
+            return MockSupabaseQuery(self, MockSupabaseResponse([{**data, 'id': 1}]))
+        
+        def update(self, data, **kwargs):
+            return MockSupabaseQuery(self, MockSupabaseResponse([data]))
+    
+    class MockSupabaseRpc:
+        """Emulates the Postgres functions in supabase/migrations"""
+        def __init__(self, fn, params, owner):
+            self.fn = fn
+            self.params = params
+            self.owner = owner
+        
+        async def execute(self):
+            self.owner.round_trips += 1
+            self.owner.rpc_calls.append((self.fn, self.params))
+            if self.fn == 'register_user':
+                if self.params['p_invitation_code'] != 'TESTCODE123':
+                    raise APIError({'message': 'Invalid or used invitation code', 'code': 'P0001'})
+                if self.params['p_email'] == 'test@example.com':
+                    raise APIError({'message': 'Email already registered', 'code': 'P0001'})
                 return MockSupabaseResponse([{
                     'id': 1,
-                    'email': 'test@example.com',
-                    'username': 'testuser',
-                    'password_hash': '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewY5GyWfQf6R',
-                    'created_at': datetime.utcnow().isoformat()
-                }])
-            elif self.table_name == 'invitation_codes':
-                return MockSupabaseResponse([{
-                    'code': 'TESTCODE123',
-                    'used': False
+                    'email': self.params['p_email'],
+                    'username': self.params['p_username'],
+                    'created_at': _NOW_ISO
                 }])
-            elif self.table_name == 'courses':
+            elif self.fn == 'enroll_in_course':
+                if self.params['p_course_id'] != 1:
+                    raise APIError({'message': 'Course not found', 'code': 'P0002'})
+                if (self.params['p_user_id'], self.params['p_course_id']) in self.owner.enrollments:
+                    raise APIError({'message': 'Already enrolled in this course', 'code': 'P0001'})
                 return MockSupabaseResponse([{
                     'id': 1,
-                    'title': 'HSK 1',
-                    'description': 'Beginner Chinese',
-                    'published': True,
-                    'created_at': datetime.utcnow().isoformat()
+                    'user_id': self.params['p_user_id'],
+                    'course_id': self.params['p_course_id'],
+                    'enrolled_at': _NOW_ISO,
+                    'progress': 0
                 }])
             return MockSupabaseResponse([])
-        
-        def insert(self, data):
-            data['id'] = 1
-            return MockSupabaseResponse([data])
-        
-        def update(self, data):
-            return MockSupabaseResponse([data])
     
     class MockSupabase:
+        # (user_id, course_id) pairs that enroll_in_course treats as existing rows
+        enrollments = frozenset()
+        
+        def __init__(self):
+            # Queries and RPCs executed, i.e. database round trips
+            self.round_trips = 0
+            # (function name, params) for every RPC executed, in order
+            self.rpc_calls = []
+        
+        @functools.lru_cache(maxsize=None)
         def table(self, table_name):
-            return MockSupabaseTable(table_name)
-    
-    # Monkeypatch supabase client
-    import fastapi_example
-    monkeypatch.setattr(fastapi_example, "supabase", MockSupabase())
+            return MockSupabaseTable(table_name, self)
+        
+        def rpc(self, fn, params=None):
+            return MockSupabaseRpc(fn, params or {}, self)
     
-    return MockSupabase()
+    # Override the client dependency; the function-scoped monkeypatch cannot
+    # outlive a single test, so use a context bound to the class scope
+    mock = MockSupabase()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setitem(fastapi_app.dependency_overrides, get_supabase, lambda: mock)
+        yield mock
 
 
 @pytest.fixture
+def mock_supabase_enrolled(mock_supabase, monkeypatch):
+    """Mock Supabase where the test user is already enrolled in course 1"""
+    monkeypatch.setattr(mock_supabase, "enrollments", frozenset({(1, 1)}))
+    return mock_supabase
+
+
+@pytest.fixture(scope="session")
 def auth_token():
-    """Generate test authentication token"""
-    token_data = {"sub": 1}
-    expire = datetime.utcnow() + timedelta(minutes=30)
+    """Generate test authentication token once; it outlives the suite"""
+    token_data = {"sub": "1"}
+    expire = datetime.utcnow() + timedelta(hours=1)
     token_data.update({"exp": expire})
-    return jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
+    return _JWT.encode(token_data, _HMAC_KEY, algorithm=ALGORITHM)
+
+
+@pytest.fixture(scope="session")
+def auth_headers(auth_token):
+    """Authorization header for the test token, built once and shared read-only"""
+    return MappingProxyType({"Authorization": f"Bearer {auth_token}"})
+
+
+@pytest.fixture(scope="session")
+def auth_json_headers(auth_headers):
+    """Authorization plus JSON content-type, for raw-content requests"""
+    return MappingProxyType({**auth_headers, **JSON_HEADERS})
 
 
 # ============= Authentication Tests =============
@@ -92,14 +333,11 @@ def auth_token():
 class TestAuthentication:
     """Test authentication endpoints for feature parity"""
     
-    def test_register_success(self, mock_supabase):
+    pytestmark = [session_loop, pytest.mark.usefixtures("mock_supabase")]
+    
+    async def test_register_success(self, aclient):
         """Test successful user registration"""
-        response = client.post("/api/auth/register", json={
-            "email": "newuser@example.com",
-            "password": "SecurePass123!",
-            "username": "newuser",
-            "invitation_code": "TESTCODE123"
-        })
+        response = await aclient.post("/api/auth/register", content=REGISTER_BODY, headers=JSON_HEADERS)
         
         assert response.status_code == 201
         data = response.json()
@@ -107,21 +345,32 @@ class TestAuthentication:
         assert data["token_type"] == "bearer"
         assert data["user"]["email"] == "newuser@example.com"
     
-    def test_register_invalid_invitation(self, mock_supabase):
-        """Test registration with invalid invitation code"""
-        response = client.post("/api/auth/register", json={
-            "email": "newuser@example.com",
-            "password": "SecurePass123!",
-            "username": "newuser",
-            "invitation_code": "INVALID"
-        })
+    @pytest.mark.parametrize("body, detail", [
+        (REGISTER_INVALID_INVITATION_BODY, "Invalid or used invitation code"),
+        (REGISTER_EXISTING_EMAIL_BODY, "Email already registered"),
+    ], ids=["invalid_invitation", "existing_email"])
+    async def test_register_rejected(self, aclient, body, detail):
+        """Test registration with an unusable invitation code or a taken email"""
+        response = await aclient.post("/api/auth/register", content=body, headers=JSON_HEADERS)
         
         assert response.status_code == 400
-        assert "Invalid or used invitation code" in response.json()["detail"]
+        assert response.json()["detail"] == detail
     
-    def test_register_weak_password(self):
+    async def test_register_invalid_invitation_skips_hashing(self, aclient, monkeypatch):
+        """Test an unusable invitation code is rejected before the password is hashed"""
+        import fastapi_example
+        hashed = []
+        monkeypatch.setattr(fastapi_example, "get_password_hash", lambda password: hashed.append(password))
+        response = await aclient.post(
+            "/api/auth/register", content=REGISTER_INVALID_INVITATION_BODY, headers=JSON_HEADERS
+        )
+        
+        assert response.status_code == 400
+        assert hashed == []
+    
+    async def test_register_weak_password(self, aclient):
         """Test password validation"""
-        response = client.post("/api/auth/register", json={
+        response = await aclient.post("/api/auth/register", json={
             "email": "newuser@example.com",
             "password": "weak",
             "username": "newuser",
@@ -130,41 +379,76 @@ class TestAuthentication:
         
         assert response.status_code == 422  # Validation error
     
-    def test_login_success(self, mock_supabase):
-        """Test successful login"""
-        response = client.post("/api/auth/login", json={
-            "email": "test@example.com",
+    async def test_login_malformed_email(self, aclient):
+        """Test emails without an @ are rejected during validation"""
+        response = await aclient.post("/api/auth/login", json={
+            "email": "not-an-email",
             "password": "password123"
         })
         
-        assert response.status_code == 200
-        data = response.json()
-        assert "access_token" in data
-        assert data["user"]["email"] == "test@example.com"
+        assert response.status_code == 422
     
-    def test_login_invalid_credentials(self, mock_supabase):
-        """Test login with wrong credentials"""
-        response = client.post("/api/auth/login", json={
-            "email": "test@example.com",
-            "password": "wrongpassword"
-        })
-        
-        assert response.status_code == 401
+    @pytest.mark.parametrize("body, expected_status", [
+        (LOGIN_BODY, 200),
+        (LOGIN_WRONG_PASSWORD_BODY, 401),
+    ], ids=["success", "invalid_credentials"])
+    async def test_login(self, aclient, body, expected_status):
+        """Test login with correct and wrong credentials"""
+        response = await aclient.post("/api/auth/login", content=body, headers=JSON_HEADERS)
+        
+        assert response.status_code == expected_status
+        if expected_status == 200:
+            data = response.json()
+            assert "access_token" in data
+            assert data["user"]["email"] == "test@example.com"
+            assert _JWT.decode(data["access_token"], _HMAC_KEY, algorithms=[ALGORITHM])["sub"] == "1"
     
-    def test_get_current_user(self, mock_supabase, auth_token):
+    async def test_get_current_user(self, aclient, auth_headers):
         """Test getting current user info"""
-        response = client.get(
+        response = await aclient.get(
             "/api/auth/me",
-            headers={"Authorization": f"Bearer {auth_token}"}
+            headers=auth_headers
         )
         
         assert response.status_code == 200
         data = response.json()
         assert data["email"] == "test@example.com"
+
+    async def test_get_current_user_cached(self, aclient, fastapi_app, auth_headers, monkeypatch):
+        """Test repeat tokens are served without a database lookup"""
+        assert (await aclient.get("/api/auth/me", headers=auth_headers)).status_code == 200
+
+        monkeypatch.setitem(fastapi_app.dependency_overrides, get_supabase, lambda: None)
+        response = await aclient.get("/api/auth/me", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.json()["email"] == "test@example.com"
+
+    async def test_user_loader_coalesces_lookups(self, mock_supabase):
+        """Test concurrent lookups of distinct ids in one tick share a single query"""
+        import fastapi_example
+        users = mock_supabase.table("users")
+        calls_before = users.calls
+        
+        loader = fastapi_example.UserLoader()
+        first, missing = await asyncio.gather(
+            loader.load(1, mock_supabase), loader.load(2, mock_supabase)
+        )
+        
+        assert first["id"] == 1
+        assert missing is None  # no row for id 2
+        assert users.calls - calls_before == 1
+
+    async def test_get_current_user_token_without_exp(self, aclient):
+        """Test a validly signed token lacking exp is rejected, not cached"""
+        token = _JWT.encode({"sub": "1"}, _HMAC_KEY, algorithm=ALGORITHM)
+        response = await aclient.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+        
+        assert response.status_code == 401
     
-    def test_get_current_user_unauthorized(self):
+    async def test_get_current_user_unauthorized(self, aclient):
         """Test accessing protected route without token"""
-        response = client.get("/api/auth/me")
+        response = await aclient.get("/api/auth/me")
         
         assert response.status_code == 403  # No credentials provided
 
@@ -174,44 +458,79 @@ class TestAuthentication:
 class TestCourseManagement:
     """Test course endpoints for feature parity"""
     
-    def test_get_courses(self, mock_supabase):
+    pytestmark = [session_loop, pytest.mark.usefixtures("mock_supabase")]
+    
+    async def test_get_courses(self, aclient):
         """Test getting all courses"""
-        response = client.get("/api/courses")
+        response = await aclient.get("/api/courses")
         
         assert response.status_code == 200
         courses = response.json()
-        assert isinstance(courses, list)
-        if len(courses) > 0:
-            assert "title" in courses[0]
+        assert len(courses) == 1
+        assert courses[0]["id"] == 1
+        assert courses[0]["title"] == "HSK 1"
     
-    def test_get_course_detail(self, mock_supabase):
+    async def test_get_courses_cached(self, aclient, fastapi_app, monkeypatch):
+        """Test the published course list is served from cache within its TTL"""
+        import fastapi_example
+        monkeypatch.setattr(fastapi_example, "_courses_cache", None)
+        first = await aclient.get("/api/courses")
+        
+        monkeypatch.setitem(fastapi_app.dependency_overrides, get_supabase, lambda: None)
+        second = await aclient.get("/api/courses")
+        
+        assert second.status_code == 200
+        assert second.content == first.content
+    
+    async def test_get_course_detail(self, aclient):
         """Test getting specific course"""
-        response = client.get("/api/courses/1")
+        response = await aclient.get("/api/courses/1")
         
         assert response.status_code == 200
         course = response.json()
         assert course["id"] == 1
         assert "content" in course
     
-    def test_get_course_not_found(self, mock_supabase):
+    async def test_get_course_not_found(self, aclient):
         """Test getting non-existent course"""
-        response = client.get("/api/courses/9999")
+        response = await aclient.get("/api/courses/9999")
         
-        # Mock will return empty, so should get 404
-        assert response.status_code in [404, 200]
+        assert response.status_code == 404
+        assert response.json()["detail"] == "Course not found"
     
-    def test_enroll_course(self, mock_supabase, auth_token):
+    async def test_enroll_course(self, aclient, auth_headers):
         """Test course enrollment"""
-        response = client.post(
+        response = await aclient.post(
             "/api/courses/1/enroll",
-            headers={"Authorization": f"Bearer {auth_token}"}
+            headers=auth_headers
         )
         
-        assert response.status_code in [201, 400]  # Created or already enrolled
+        assert response.status_code == 201
+        assert response.json()["course_id"] == 1
     
-    def test_enroll_course_unauthorized(self, mock_supabase):
+    async def test_enroll_course_already_enrolled(self, aclient, mock_supabase_enrolled, auth_headers):
+        """Test enrolling twice in the same course"""
+        response = await aclient.post(
+            "/api/courses/1/enroll",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Already enrolled in this course"
+    
+    async def test_enroll_course_not_found(self, aclient, auth_headers):
+        """Test enrollment in a non-existent course"""
+        response = await aclient.post(
+            "/api/courses/9999/enroll",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 404
+        assert response.json()["detail"] == "Course not found"
+    
+    async def test_enroll_course_unauthorized(self, aclient):
         """Test enrollment without authentication"""
-        response = client.post("/api/courses/1/enroll")
+        response = await aclient.post("/api/courses/1/enroll")
         
         assert response.status_code == 403
 
@@ -221,11 +540,13 @@ class TestCourseManagement:
 class TestReviewSystem:
     """Test spaced repetition system for feature parity"""
     
-    def test_get_due_reviews(self, mock_supabase, auth_token):
+    pytestmark = [session_loop, pytest.mark.usefixtures("mock_supabase")]
+    
+    async def test_get_due_reviews(self, aclient, auth_headers):
         """Test getting due reviews"""
-        response = client.get(
+        response = await aclient.get(
             "/api/reviews/due",
-            headers={"Authorization": f"Bearer {auth_token}"}
+            headers=auth_headers
         )
         
         assert response.status_code == 200
@@ -234,32 +555,97 @@ class TestReviewSystem:
         assert "count" in data
         assert isinstance(data["reviews"], list)
     
-    def test_submit_review_quality_0(self, mock_supabase, auth_token):
-        """Test submitting review with quality 0 (complete failure)"""
-        response = client.post(
+    @pytest.mark.parametrize("page_size", [1, 2])
+    async def test_get_due_reviews_paged(self, aclient, auth_headers, monkeypatch, page_size):
+        """Test due reviews stream every row exactly once across keyset pages"""
+        import fastapi_example
+        monkeypatch.setattr(fastapi_example, "DUE_REVIEWS_PAGE_SIZE", page_size)
+        response = await aclient.get("/api/reviews/due", headers=auth_headers)
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert [review["id"] for review in data["reviews"]] == [1, 2, 3]
+        assert data["count"] == 3
+    
+    @pytest.mark.parametrize("quality", [0, 5], ids=["complete_failure", "perfect"])
+    async def test_submit_review(self, aclient, auth_json_headers, quality):
+        """Test submitting reviews at both ends of the quality scale"""
+        response = await aclient.post(
             "/api/reviews/submit",
-            json={"review_id": 1, "quality": 0},
-            headers={"Authorization": f"Bearer {auth_token}"}
+            content=REVIEW_BODIES[quality],
+            headers=auth_json_headers
         )
         
-        assert response.status_code in [200, 404]
+        assert response.status_code == 200
+        assert response.json()["easiness_factor"] >= 1.3
     
-    def test_submit_review_quality_5(self, mock_supabase, auth_token):
-        """Test submitting review with quality 5 (perfect)"""
-        response = client.post(
+    async def test_submit_review_not_found(self, aclient, auth_headers):
+        """Test submitting a review the user does not own"""
+        response = await aclient.post(
             "/api/reviews/submit",
-            json={"review_id": 1, "quality": 5},
-            headers={"Authorization": f"Bearer {auth_token}"}
+            json={"review_id": 9999, "quality": 4},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 404
+    
+    async def test_submit_reviews_batch_not_found(self, aclient, auth_headers):
+        """Test batch submission reports reviews the user does not own"""
+        response = await aclient.post(
+            "/api/reviews/submit/batch",
+            json={"items": [{"review_id": 1, "quality": 4}, {"review_id": 9999, "quality": 2}]},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 404
+    
+    async def test_submit_reviews_batch(self, aclient, mock_supabase, auth_headers):
+        """Test a batch is scheduled per item and written with one RPC"""
+        calls_before = len(mock_supabase.rpc_calls)
+        response = await aclient.post(
+            "/api/reviews/submit/batch",
+            json={"items": [{"review_id": 1, "quality": 5}, {"review_id": 2, "quality": 1}]},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [result["review_id"] for result in results] == [1, 2]
+        assert results[1]["interval_days"] == 1  # quality < 3 resets the schedule
+        
+        (fn, params), = mock_supabase.rpc_calls[calls_before:]
+        assert fn == "apply_review_updates"
+        assert params["p_user_id"] == 1
+        assert [update["id"] for update in params["p_updates"]] == [1, 2]
+    
+    async def test_submit_reviews_batch_too_large(self, aclient, auth_headers):
+        """Test batches over the size cap are rejected before any query"""
+        from fastapi_example import MAX_REVIEW_BATCH_SIZE
+        items = [{"review_id": i, "quality": 4} for i in range(MAX_REVIEW_BATCH_SIZE + 1)]
+        response = await aclient.post(
+            "/api/reviews/submit/batch",
+            json={"items": items},
+            headers=auth_headers
         )
         
-        assert response.status_code in [200, 404]
+        assert response.status_code == 422
     
-    def test_submit_review_invalid_quality(self, auth_token):
+    async def test_submit_reviews_batch_duplicate_ids(self, aclient, auth_headers):
+        """Test batch submission rejects the same review twice"""
+        response = await aclient.post(
+            "/api/reviews/submit/batch",
+            json={"items": [{"review_id": 1, "quality": 4}, {"review_id": 1, "quality": 5}]},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 422
+    
+    async def test_submit_review_invalid_quality(self, aclient, auth_headers):
         """Test validation of quality score"""
-        response = client.post(
+        response = await aclient.post(
             "/api/reviews/submit",
             json={"review_id": 1, "quality": 10},
-            headers={"Authorization": f"Bearer {auth_token}"}
+            headers=auth_headers
         )
         
         assert response.status_code == 422  # Validation error
@@ -270,19 +656,21 @@ class TestReviewSystem:
 class TestMigrationParity:
     """Tests to ensure Flask to FastAPI migration maintains feature parity"""
     
-    def test_api_response_structure_matches(self, mock_supabase):
+    @session_loop
+    async def test_api_response_structure_matches(self, aclient, mock_supabase):
         """Verify response structures match Flask version"""
         # Test that FastAPI responses match Flask format
-        response = client.get("/api/courses")
+        response = await aclient.get("/api/courses")
         assert response.status_code == 200
         
         # Should be a list of courses
         courses = response.json()
         assert isinstance(courses, list)
     
-    def test_error_response_format(self, mock_supabase):
+    @session_loop
+    async def test_error_response_format(self, aclient, mock_supabase):
         """Verify error responses match Flask format"""
-        response = client.post("/api/auth/login", json={
+        response = await aclient.post("/api/auth/login", json={
             "email": "wrong@example.com",
             "password": "wrongpass"
         })
@@ -291,27 +679,78 @@ class TestMigrationParity:
         error = response.json()
         assert "detail" in error
     
+    @session_loop
+    async def test_health_check_payload(self, aclient, fastapi_app):
+        """Verify the pre-rendered health body is valid JSON with the original fields and types"""
+        response = await aclient.get("/health")
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "healthy"
+        assert data["version"] == fastapi_app.version
+        assert isinstance(datetime.fromisoformat(data["timestamp"]), datetime)
+    
+    @session_loop
+    async def test_lifespan_resources_are_per_run(self):
+        """Verify each lifespan run opens its own client and pool, and shutdown falls back to defaults"""
+        import fastapi_example
+        from fastapi import FastAPI, Request
+        state_app = FastAPI()
+        request = Request({"type": "http", "app": state_app})
+        
+        for _ in range(2):
+            async with fastapi_example.lifespan(state_app):
+                client = fastapi_example.get_supabase(request)
+                assert client is not fastapi_example.supabase
+                assert not client.options.httpx_client.is_closed
+                executor = fastapi_example.get_password_executor(request)
+                assert executor.submit(fastapi_example.verify_password, "x", _USERS_ROW["password_hash"]).result() is False
+            
+            assert client.options.httpx_client.is_closed
+            assert fastapi_example.get_supabase(request) is fastapi_example.supabase
+            assert fastapi_example.get_password_executor(request) is fastapi_example._password_executor
+    
     def test_jwt_token_compatibility(self, auth_token):
         """Verify JWT tokens work with existing sessions"""
         # Decode token to verify structure
-        payload = jwt.decode(auth_token, SECRET_KEY, algorithms=[ALGORITHM])
-        assert "sub" in payload
+        payload = _JWT.decode(auth_token, _HMAC_KEY, algorithms=[ALGORITHM])
+        assert payload["sub"] == "1"  # string subject, as PyJWT >= 2.10 requires
         assert "exp" in payload
     
     def test_sm2_algorithm_implementation(self):
-        """Verify spaced repetition algorithm matches original"""
-        # Test SM-2 algorithm calculations
-        quality = 4
-        easiness = 2.5
-        repetition = 3
-        interval = 6
+        """Verify spaced repetition algorithm matches original across every quality"""
+        from fastapi_example import sm2_schedule
+        
+        review_record = {"repetition": 3, "easiness": 2.5, "interval": 6}
+        qualities = range(6)
         
-        # Calculate new easiness
-        new_easiness = easiness + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
-        new_easiness = max(1.3, new_easiness)
+        # Original per-submission formula, evaluated over the whole quality domain
+        expected = [max(1.3, 2.5 + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))) for q in qualities]
+        actual = [sm2_schedule(review_record, q)[1] for q in qualities]
         
-        assert new_easiness > 1.3
-        assert isinstance(new_easiness, float)
+        assert actual == pytest.approx(expected)
+        assert all(isinstance(e, float) and e >= 1.3 for e in actual)
+    
+    def test_sm2_easiness_table_matches_formula(self):
+        """Verify the precomputed SM-2 easiness table against the published SM-2 deltas"""
+        from fastapi_example import _SM2_EASINESS_DELTA
+        
+        assert _SM2_EASINESS_DELTA == pytest.approx((-0.8, -0.54, -0.32, -0.14, 0.0, 0.1))
+    
+    @pytest.mark.parametrize("stored_repetition, quality, expected", [
+        (0, 4, (1, 1)),
+        (1, 4, (2, 6)),
+        (2, 4, (3, 15.0)),  # interval 6 * easiness 2.5
+        (5, 2, (0, 1)),
+    ], ids=["first_success", "second_success", "later_success", "failure_resets"])
+    def test_sm2_repetition_and_interval(self, stored_repetition, quality, expected):
+        """Verify (repetition, interval) match the original repetition 1 / 2 / else chain"""
+        from fastapi_example import sm2_schedule
+        
+        review_record = {"repetition": stored_repetition, "easiness": 2.5, "interval": 6}
+        new_repetition, _, new_interval = sm2_schedule(review_record, quality)
+        
+        assert (new_repetition, new_interval) == pytest.approx(expected)
 
 
 # ============= Performance Tests =============
@@ -319,67 +758,77 @@ class TestMigrationParity:
 class TestPerformance:
     """Test performance improvements in FastAPI"""
     
-    def test_async_endpoint_performance(self, mock_supabase):
+    pytestmark = pytest.mark.slow
+    
+    @session_loop
+    async def test_async_endpoint_performance(self, aclient, mock_supabase):
         """Test that async endpoints handle concurrent requests"""
-        import asyncio
+        responses = await asyncio.gather(*[aclient.get("/api/courses") for _ in range(32)])
         
-        async def make_request():
-            response = client.get("/api/courses")
-            return response.status_code
-        
-        # Simulate concurrent requests
-        # This would be more robust with actual async client
-        response = client.get("/api/courses")
-        assert response.status_code == 200
+        assert all(response.status_code == 200 for response in responses)
     
-    def test_health_check_response_time(self):
-        """Test health check endpoint is fast"""
+    @session_loop
+    async def test_health_check_response_time(self, aclient):
+        """Test health check endpoint is fast (median of warmed-up requests)"""
+        import statistics
         import time
         
-        start = time.time()
-        response = client.get("/health")
-        duration = time.time() - start
+        for _ in range(10):
+            await aclient.get("/health")
+        
+        durations = []
+        for _ in range(20):
+            start = time.perf_counter_ns()
+            response = await aclient.get("/health")
+            durations.append(time.perf_counter_ns() - start)
+            assert response.status_code == 200
         
+        assert statistics.median(durations) < 10_000_000  # 10ms
+    
+    def test_health_check_benchmark(self, benchmark, bench_get):
+        """Benchmark the health check with setup kept out of the timed callable"""
+        response = benchmark(bench_get, "/health")
+        assert response.status_code == 200
+    
+    def test_get_courses_benchmark(self, benchmark, bench_get, mock_supabase):
+        """Benchmark the (cached) course listing against the mocked backend"""
+        response = benchmark(bench_get, "/api/courses")
         assert response.status_code == 200
-        assert duration < 1.0  # Should be very fast
 
 
 # ============= Integration Tests =============
 
+@session_loop
 class TestIntegration:
     """End-to-end integration tests"""
     
-    def test_complete_user_flow(self, mock_supabase):
-        """Test complete user journey: register -> login -> enroll -> review"""
-        
-        # 1. Register
-        register_response = client.post("/api/auth/register", json={
-            "email": "integration@test.com",
-            "password": "SecurePass123!",
-            "username": "integrationuser",
-            "invitation_code": "TESTCODE123"
-        })
+    @pytest.mark.slow
+    async def test_complete_user_flow(self, aclient, mock_supabase):
+        """Test complete user journey: register -> courses + enroll + reviews"""
+        round_trips_before = mock_supabase.round_trips
+        
+        # 1. Register; the token is needed by every later step
+        register_response = await aclient.post(
+            "/api/auth/register", content=INTEGRATION_REGISTER_BODY, headers=JSON_HEADERS
+        )
         assert register_response.status_code == 201
-        token = register_response.json()["access_token"]
-        
-        # 2. Get courses
-        courses_response = client.get("/api/courses")
-        assert courses_response.status_code == 200
+        headers = {"Authorization": f"Bearer {register_response.json()['access_token']}"}
         
-        # 3. Enroll in course
-        enroll_response = client.post(
-            "/api/courses/1/enroll",
-            headers={"Authorization": f"Bearer {token}"}
+        # 2-4. Get courses, enroll and get due reviews are independent
+        courses_response, enroll_response, reviews_response = await asyncio.gather(
+            aclient.get("/api/courses"),
+            aclient.post("/api/courses/1/enroll", headers=headers),
+            aclient.get("/api/reviews/due", headers=headers)
         )
-        assert enroll_response.status_code in [201, 400]
         
-        # 4. Get due reviews
-        reviews_response = client.get(
-            "/api/reviews/due",
-            headers={"Authorization": f"Bearer {token}"}
-        )
+        assert courses_response.status_code == 200
+        assert enroll_response.status_code == 201
         assert reviews_response.status_code == 200
-
+        
+        # invitation check and register, user lookup (shared by enroll and reviews),
+        # enroll, due reviews, plus the course list when its cache is cold
+        assert mock_supabase.round_trips - round_trips_before <= 6
 
 if __name__ == "__main__":
+    # With pytest-xdist installed, add "-n auto" to shard tests across CPU cores
     pytest.main([__file__, "-v"])